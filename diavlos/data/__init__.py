@@ -2,4 +2,12 @@ from diavlos.src.helper import DataUtil
 
 data_util = DataUtil(__file__)
 IN_FILES = data_util.files_with_extension('in', 'yaml')
-INOUT_FILES = data_util.files_with_extension('inout', 'pickle')
+# Caches, zstd-compressed msgpack. They only exist after their first fetch.
+INOUT_FILES = {
+    name: data_util.file_path('inout', f'{name}.msgpack.zst')
+    for name in ('org_all', 'org_hierarchy', 'org_details', 'org_purposes',
+                 'org_types')
+}
+# Caches written before the switch to msgpack, only read until the
+# corresponding INOUT_FILES exist
+LEGACY_INOUT_FILES = data_util.files_with_extension('inout', 'pickle')
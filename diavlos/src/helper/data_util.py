@@ -15,3 +15,7 @@ class DataUtil:
         return {os.path.splitext(file)[0]: os.path.join(input_dir, file)
                 for file in os.listdir(input_dir) if file.endswith(
                     f'.{extension}')}
+
+    def file_path(self, dir_, filename):
+        """Return the path of a file in a directory, existing or not."""
+        return os.path.join(self._input_dir(dir_), filename)
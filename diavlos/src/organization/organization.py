@@ -1,17 +1,28 @@
 """A module for fetching, adding and updating organizations
 from the apografi API to the diavlos site.
 """
+import aiohttp
+import asyncio
+import functools
 import inspect
 import logging
+import msgspec
+import os
 import pickle
 import re
 import requests
+import threading
+import time
+import zstandard
 
-from mwtemplates import TemplateEditor
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from xml.sax.saxutils import escape
 
 from diavlos.data import INOUT_FILES
+from diavlos.data import LEGACY_INOUT_FILES
 
 from diavlos.src.site import Site
 from diavlos.src.site import SiteError
@@ -21,6 +32,16 @@ logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.DEBUG)
 
 CATEGORY_PREFIX = '[[Category:'
+# Seconds to wait for the apografi API to connect or send data
+API_TIMEOUT = 10
+# Caches written before the switch to msgpack are pickles (protocol >= 2),
+# which always start with the PROTO opcode followed by the protocol number.
+PICKLE_PROTO_OPCODE = 0x80
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+ZSTD_LEVEL = 3
+
+_msgpack_encoder = msgspec.msgpack.Encoder()
+_msgpack_decoder = msgspec.msgpack.Decoder()
 
 
 class OrganizationError(Exception):
@@ -42,43 +63,83 @@ def _cli_command(func):
     return func
 
 
-def _pickle(data, file):
-    with open(file, 'wb') as handle:
-        pickle.dump(data, handle, protocol=pickle.HIGHEST_PROTOCOL)
+def _dump(data, file):
+    buf = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(
+        _msgpack_encoder.encode(data))
+    # Written next to the cache and moved over it, so that readers in other
+    # threads or processes never load a partially written file
+    tmp_file = f'{file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(buf)
+        os.replace(tmp_file, file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
 
 
-def _unpickle(file):
+def _load(file):
     with open(file, 'rb') as f:
-        return pickle.load(f)
-
-
-def _fetch_data(fetch_func, pickle_data_to_file=None):
+        buf = f.read()
+    # Uncompressed caches are still read as is
+    if buf.startswith(ZSTD_MAGIC):
+        buf = zstandard.ZstdDecompressor().decompress(buf)
+    # A lone 0x80 byte is an empty msgpack map, not a pickle
+    if len(buf) > 1 and buf[0] == PICKLE_PROTO_OPCODE:
+        # Legacy pickle cache, rewritten as msgpack on the next fetch
+        return pickle.loads(buf)
+    return _msgpack_decoder.decode(buf)
+
+
+def _readable_file(file, legacy_file=None):
+    # A legacy pickle cache is read until the first fetch writes its
+    # replacement
+    if legacy_file is not None and not os.path.exists(file) and \
+            os.path.exists(legacy_file):
+        return legacy_file
+    return file
+
+
+def _fetch_data(fetch_func, cache_data_to_file=None):
     data = fetch_func()
-    if pickle_data_to_file is not None:
-        logger.debug('Pickling data...')
-        _pickle(data, pickle_data_to_file)
-        logger.debug('Pickled data.')
+    if cache_data_to_file is not None:
+        logger.debug('Caching data...')
+        _dump(data, cache_data_to_file)
+        logger.debug('Cached data.')
     return data
 
 
-def _data(file, fetch_from_api_func, fetch_from_api=False):
+def _data(file, fetch_from_api_func, fetch_from_api=False, max_age=None,
+          legacy_file=None):
+    if not fetch_from_api and max_age is not None:
+        # Data older than max_age is fetched again before it is used
+        try:
+            fetch_from_api = time.time() - os.path.getmtime(file) > max_age
+        except FileNotFoundError:
+            pass
     if fetch_from_api:
-        data = _fetch_data(fetch_from_api_func, pickle_data_to_file=file)
+        data = _fetch_data(fetch_from_api_func, cache_data_to_file=file)
     else:
+        read_file = _readable_file(file, legacy_file)
         try:
-            data = _unpickle(file)
+            data = _load(read_file)
         except FileNotFoundError:
-            data = _fetch_data(fetch_from_api_func, pickle_data_to_file=file)
+            data = _fetch_data(fetch_from_api_func, cache_data_to_file=file)
     return data
 
 
-def _add_text_to_page(page, text, replace_text=None):
+def _add_text_to_page(page, text, replace_text=None, page_text=None):
+    # page_text is the already known text of the page, if any. The text of
+    # the page after the update is returned, so that callers touching the
+    # same page again do not need to fetch it.
     new_text = None
     debug_message = None
     debug_msg_template = '{page_name_text} now contains {text_text}'
     if page is not None:
-        if page.exists:
+        if page_text is None and page.exists:
             page_text = page.text()
+        if page_text is not None:
             if replace_text is not None and \
                     replace_text in page_text:
                 # If replace_text in page text replace it
@@ -94,17 +155,24 @@ def _add_text_to_page(page, text, replace_text=None):
             new_text = text
         if new_text is not None:
             page.edit(new_text)
+            page_text = new_text
             if debug_message is None:
                 debug_message = debug_msg_template.format(
                     page_name_text=page.name,
                     text_text=new_text)
             logger.debug(debug_message)
+    return page_text
+
 
+def _api_data(session, url):
+    return msgspec.json.decode(
+        session.get(url, timeout=API_TIMEOUT).content)['data']
 
-def _dict_from_api_endpoint(endpoint):
+
+def _dict_from_api_endpoint(session, endpoint):
     return {
         datum['id']: datum['description']
-        for datum in requests.get(endpoint).json()['data']
+        for datum in _api_data(session, endpoint)
     }
 
 class Organization:
@@ -118,10 +186,23 @@ class Organization:
     DICT_ENDPOINT = f'{API_BASE_URL}/public/metadata/dictionary'
     PURPOSES_DICT_ENDPOINT = f'{DICT_ENDPOINT}/Functions'
     TYPES_DICT_ENDPOINT = f'{DICT_ENDPOINT}/OrganizationTypes'
+    API_MAX_WORKERS = 32
+    API_MAX_CONCURRENT_REQUESTS = 64
+    API_MAX_RETRIES = 3
+    API_RETRY_BACKOFF_FACTOR = 0.3
+    API_RETRY_STATUSES = (429, 500, 502, 503, 504)
+    API_HEADERS = {'User-Agent': 'diavlos/0.1.0'}
     # Files
-    ALL_ORGS_PICKLE_FILE = INOUT_FILES['org_all']
-    HIERARCHY_PICKLE_FILE = INOUT_FILES['org_hierarchy']
-    DETAILS_PICKLE_FILE = INOUT_FILES['org_details']
+    ALL_ORGS_CACHE_FILE = INOUT_FILES['org_all']
+    HIERARCHY_CACHE_FILE = INOUT_FILES['org_hierarchy']
+    DETAILS_CACHE_FILE = INOUT_FILES['org_details']
+    ALL_ORGS_LEGACY_CACHE_FILE = LEGACY_INOUT_FILES.get('org_all')
+    HIERARCHY_LEGACY_CACHE_FILE = LEGACY_INOUT_FILES.get('org_hierarchy')
+    DETAILS_LEGACY_CACHE_FILE = LEGACY_INOUT_FILES.get('org_details')
+    PURPOSES_CACHE_FILE = INOUT_FILES['org_purposes']
+    TYPES_CACHE_FILE = INOUT_FILES['org_types']
+    # Seconds after which the cached dictionaries are refreshed
+    DICT_CACHE_MAX_AGE = 24 * 60 * 60
     # Mediawiki
     CATEGORY_NAME = 'Φορείς'
     CATALOGUE_CATEGORY_NAME = 'Κατάλογος Φορέων'
@@ -129,8 +210,10 @@ class Organization:
     CATALOGUE_CATEGORY = f'[[Category:{CATALOGUE_CATEGORY_NAME}]]'
     NAMESPACE = 'Φορέας'
     NAMESPACE_NUMBER = 9000
+    # Max titles per query, the API limit for users without apihighlimits
+    PAGES_PER_QUERY = 50
     TEMPLATE_CONTACT_POINT_TELEPHONE = 'contactPoint_telephone'
-    TEMPLATE_FIELD_NAME_SUFFIXES = [
+    TEMPLATE_FIELD_NAME_SUFFIXES = (
         'code',
         'preferredLabel',
         'alternativeLabels',
@@ -148,27 +231,43 @@ class Organization:
         'foundationDate',
         'terminationDate',
         'organizationType',
-    ]
+    )
+    # (suffix, details keys) pairs, e.g. ('url', None) or
+    # ('contactPoint_email', ['contactPoint', 'email'])
+    TEMPLATE_FIELDS = tuple(
+        (key, key.split('_') if '_' in key else None)
+        for key in TEMPLATE_FIELD_NAME_SUFFIXES)
     TEMPLATE_NAME = 'Φορέας'
     TEMPLATE_PARAM_PREFIX = 'gov_org_'
-    template_parameters = []
-    for key in TEMPLATE_FIELD_NAME_SUFFIXES:
-        template_parameters.append(f'|{TEMPLATE_PARAM_PREFIX}{key}=')
-    TEMPLATE_PARAMETERS_TEXT = ''.join(template_parameters)
-    TEMPLATE = f'{{{{{TEMPLATE_NAME}{TEMPLATE_PARAMETERS_TEXT}}}}}'
+    # Template text of an org, formatted with a {suffix: value} dict.
+    # str.format is mapped over the suffixes, as a comprehension in the class
+    # body cannot see TEMPLATE_PARAM_PREFIX.
+    TEMPLATE_FORMAT = '{{{{' + TEMPLATE_NAME + ''.join(map(
+        ('\n|' + TEMPLATE_PARAM_PREFIX + '{0}={{{0}}}').format,
+        TEMPLATE_FIELD_NAME_SUFFIXES)) + '\n}}}}'
+    TEMPLATE_REGEX = re.compile(rf'{{{{{TEMPLATE_NAME}[^{{}}]+}}}}')
     # Miscellaneous
     STATUS_TRANSLATION = {
         'Active': 'Ενεργός',
         'Inactive': 'Ανενεργός'
     }
+    LEADING_DIGITS_REGEX = re.compile(r'\d*')
 
     def __init__(self):
         self.__site = Site()
         self._site_logged_in = False
+        # HTTP session, keeps connections to the API alive across requests
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(
+            pool_connections=self.API_MAX_WORKERS,
+            pool_maxsize=self.API_MAX_WORKERS,
+            max_retries=Retry(total=self.API_MAX_RETRIES,
+                              backoff_factor=self.API_RETRY_BACKOFF_FACTOR,
+                              status_forcelist=self.API_RETRY_STATUSES)))
+        self._session.headers.update(self.API_HEADERS)
         # Dictionaries
-        self.__data_by_code = {}
-        self.__name_by_code = {}
-        self.__code_by_name = {}
+        self.__code_by_name = None
+        self.__code_by_name_mtime = None
         self.__purpose_by_id = None
         self.__type_by_id = None
 
@@ -183,55 +282,100 @@ class Organization:
                 self._site_logged_in = True
         return self.__site
 
-    @property
-    def _purpose_by_id(self):
-        if self.__purpose_by_id is None:
-            self.__purpose_by_id = _dict_from_api_endpoint(
-                self.PURPOSES_DICT_ENDPOINT)
+    def _purpose_by_id(self, fetch_from_api=False):
+        if self.__purpose_by_id is None or fetch_from_api:
+            self.__purpose_by_id = _data(
+                self.PURPOSES_CACHE_FILE,
+                functools.partial(_dict_from_api_endpoint, self._session,
+                                  self.PURPOSES_DICT_ENDPOINT),
+                fetch_from_api=fetch_from_api,
+                max_age=self.DICT_CACHE_MAX_AGE)
         return self.__purpose_by_id
 
-    @property
-    def _type_by_id(self):
-        if self.__type_by_id is None:
-            self.__type_by_id = _dict_from_api_endpoint(
-                self.TYPES_DICT_ENDPOINT)
+    def _type_by_id(self, fetch_from_api=False):
+        if self.__type_by_id is None or fetch_from_api:
+            self.__type_by_id = _data(
+                self.TYPES_CACHE_FILE,
+                functools.partial(_dict_from_api_endpoint, self._session,
+                                  self.TYPES_DICT_ENDPOINT),
+                fetch_from_api=fetch_from_api,
+                max_age=self.DICT_CACHE_MAX_AGE)
         return self.__type_by_id
 
+    @functools.lru_cache(maxsize=None)
     def _data_by_code(self, code):
-        data = self.__data_by_code.get(code)
-        if data is None:
-            try:
-                self.__data_by_code[code] = requests.get(
-                    f'{self.ORGS_ENDPOINT}/{code}').json()['data']
-            except Exception:
+        try:
+            return _api_data(self._session, f'{self.ORGS_ENDPOINT}/{code}')
+        except Exception:
+            logger.error(f'No data found for org: {code}')
+            return None
+
+    async def _fetch_data_by_codes(self, codes):
+        connector = aiohttp.TCPConnector(
+            limit=self.API_MAX_CONCURRENT_REQUESTS)
+        timeout = aiohttp.ClientTimeout(total=API_TIMEOUT)
+        # Requests only start once a connection is free, so that the timeout
+        # does not count the time spent waiting for one
+        semaphore = asyncio.Semaphore(self.API_MAX_CONCURRENT_REQUESTS)
+        async with aiohttp.ClientSession(
+                connector=connector, headers=self.API_HEADERS,
+                timeout=timeout) as session:
+
+            async def fetch(code):
+                # Retried like the requests session: on connection errors,
+                # timeouts and API_RETRY_STATUSES, with exponential backoff
+                for retry in range(self.API_MAX_RETRIES + 1):
+                    if retry:
+                        await asyncio.sleep(
+                            self.API_RETRY_BACKOFF_FACTOR * 2 ** (retry - 1))
+                    try:
+                        async with semaphore, session.get(
+                                f'{self.ORGS_ENDPOINT}/{code}') as response:
+                            if response.status in self.API_RETRY_STATUSES:
+                                continue
+                            return msgspec.json.decode(
+                                await response.read())['data']
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        continue
+                    except Exception:
+                        break
                 logger.error(f'No data found for org: {code}')
-            else:
-                data = self.__data_by_code.get(code)
-        return data
+                return None
+            return await asyncio.gather(*[fetch(code) for code in codes])
 
+    @functools.lru_cache(maxsize=None)
     def _name_by_code(self, code):
-        name = self.__name_by_code.get(code)
-        if name is None:
-            data = self._data_by_code(code)
-            if data is not None:
-                name = data['preferredLabel']
-                self.__name_by_code[code] = name
-        return name
+        data = self._data_by_code(code)
+        return None if data is None else data['preferredLabel']
 
     def _code_by_name(self, name):
-        code = self.__code_by_name.get(name)
-        if code is None:
-            self.__code_by_name = {
-                ' '.join(org_dict['preferredLabel'].split()): org_dict['code']
-                for org_dict in self._all()
-            }
+        code = None
+        if self.__code_by_name is not None:
             code = self.__code_by_name.get(name)
+        if code is None:
+            # The index is built once and rebuilt on a miss only if the orgs
+            # cache has been updated since, e.g. by another process
+            try:
+                mtime = os.path.getmtime(_readable_file(
+                    self.ALL_ORGS_CACHE_FILE,
+                    self.ALL_ORGS_LEGACY_CACHE_FILE))
+            except OSError:
+                mtime = None
+            if self.__code_by_name is None or \
+                    mtime != self.__code_by_name_mtime:
+                self.__code_by_name = {
+                    ' '.join(org_dict['preferredLabel'].split()):
+                        org_dict['code']
+                    for org_dict in self._all()
+                }
+                self.__code_by_name_mtime = mtime
+                code = self.__code_by_name.get(name)
         return code
 
     def _tree_by_code(self, code):
         orgs_tree_url = f'{self.ORGS_TREE_URL_PREFIX}{code}'
         try:
-            tree_dict = requests.get(orgs_tree_url).json()['data']
+            tree_dict = _api_data(self._session, orgs_tree_url)
         except Exception:
             logger.error(f'Failed to request {orgs_tree_url}.')
             tree_dict = None
@@ -245,15 +389,78 @@ class Organization:
             logger.error(e, name)
             return None
 
+    def _pages_with_text(self, titles):
+        """Fetch pages along with the text of their latest revision.
+
+        The pages are queried PAGES_PER_QUERY titles at a time, instead of
+        one request for each page and one more for its text.
+
+        Args:
+            titles (list): The titles of the pages.
+
+        Yields:
+            tuple: The title, the page (None if the title is invalid), the
+                page text and the keyword arguments to pass to page.edit() so
+                that edit conflicts are still detected.
+        """
+        action = 'query'
+        for i in range(0, len(titles), self.PAGES_PER_QUERY):
+            batch_titles = titles[i:i + self.PAGES_PER_QUERY]
+            kwargs = {
+                'format': 'json',
+                'titles': '|'.join(batch_titles),
+                'prop': 'info|revisions',
+                'inprop': 'protection',
+                'rvprop': 'content|timestamp',
+                'rvslots': 'main',
+                'curtimestamp': 1,
+                'continue': ''
+            }
+            normalized_titles = {}
+            page_infos = {}
+            continue_value = {}
+            while continue_value is not None:
+                kwargs.update(continue_value)
+                answer = self._site.api(action, **kwargs)
+                start_timestamp = answer.get('curtimestamp')
+                continue_value = answer.get('continue')
+                for normalized in answer[action].get('normalized', []):
+                    normalized_titles[normalized['from']] = normalized['to']
+                # Revisions of a page may only come with a later continuation
+                for page_info in answer[action]['pages'].values():
+                    page_infos.setdefault(
+                        page_info['title'], {}).update(page_info)
+            for title in batch_titles:
+                page_info = page_infos.get(
+                    normalized_titles.get(title, title), {})
+                if 'title' not in page_info or 'invalid' in page_info:
+                    logger.error(f'Invalid page title: {title}')
+                    yield title, None, '', {}
+                    continue
+                page = self._site.page_from_info(page_info)
+                page_text = ''
+                edit_kwargs = {}
+                revisions = page_info.get('revisions')
+                if revisions:
+                    revision = revisions[0]
+                    page_text = revision['slots']['main']['*'] \
+                        if 'slots' in revision else revision['*']
+                    edit_kwargs = {
+                        'basetimestamp': revision['timestamp'],
+                        'starttimestamp': start_timestamp
+                    }
+                yield title, page, page_text, edit_kwargs
+
     def _fetch_all_from_api(self):
         logger.debug('Fetching all orgs from API...')
-        all_orgs = requests.get(self.ORGS_ENDPOINT).json()['data']
+        all_orgs = _api_data(self._session, self.ORGS_ENDPOINT)
         logger.debug('Fetched all orgs.')
         return all_orgs
 
     def _fetch_hierarchy_from_api(self):
         logger.debug('Fetching org hierarchy from API...')
         all_orgs = self._all()
+        org_by_code = {org_dict['code']: org_dict for org_dict in all_orgs}
         parent_children_orgs = {}
         for org_dict in all_orgs:
             parent_code = org_dict.get('subOrganizationOf')
@@ -261,38 +468,33 @@ class Organization:
                 # parent_code does not exist, org_dict contains a root body
                 orgcode = org_dict['code']
                 if orgcode not in parent_children_orgs:
-                    parent_children_orgs[orgcode] = {
-                        org_dict['preferredLabel']: []}
+                    parent_children_orgs[orgcode] = (
+                        org_dict['preferredLabel'], [])
             else:
-                parentbody = parent_children_orgs.get(parent_code)
-                if parentbody is None:
-                    # Parent body does not exist
-                    # Look in api orgs
-                    for org2 in all_orgs:
-                        if org2['code'] == parent_code:
-                            # Found parent body, add child body
-                            parent_children_orgs[parent_code] = {
-                                org2['preferredLabel']: [
-                                    org_dict['preferredLabel']]
-                            }
-                            break
-                else:
-                    # Parent body already exists, append child body
-                    parentbody[next(iter(parentbody))].append(
-                        org_dict['preferredLabel'])
-                    parent_children_orgs[parent_code] = parentbody
-        hierarchy = {}
-        for parentcode, parent_children_dict in parent_children_orgs.items():
-            hierarchy[next(iter(parent_children_dict))] = \
-                list(parent_children_dict.values())[0]
+                # Orgs whose parent is not in the api orgs are skipped
+                parent_org = org_by_code.get(parent_code)
+                if parent_org is not None:
+                    # Add child body, adding its parent body if needed
+                    parent_children_orgs.setdefault(
+                        parent_code, (parent_org['preferredLabel'], [])
+                    )[1].append(org_dict['preferredLabel'])
+        hierarchy = {
+            parent_label: children
+            for parent_label, children in parent_children_orgs.values()
+        }
         logger.debug('Fetched org hierarchy.')
         return hierarchy
 
-    def fetch_details_from_api(self, org_names=None):
+    def fetch_details_from_api(self, org_names=None,
+                               fetch_dicts_from_api=False):
         """Fetch organization details from the API.
 
         Args:
             org_names (list): The names of the organizations.
+            fetch_dicts_from_api (bool): Whether to fetch the purpose and
+                type dictionaries from the API or read the most recently
+                saved ones. Saved dictionaries missing an id of the fetched
+                details are fetched again regardless.
 
         Returns:
             dict: A dictionary of the details for each organization,
@@ -302,18 +504,63 @@ class Organization:
         details = {}
         if org_names is None:
             org_names = self._all_page_names(without_namespace=True)
+        code_by_org = {}
         for org in org_names:
             code = self._code_by_name(org)
-            if code is None:
-                continue
-            data = self._data_by_code(code)
+            if code is not None:
+                code_by_org[org] = code
+        with ThreadPoolExecutor(max_workers=self.API_MAX_WORKERS) as executor:
+            # The purpose and type dictionaries are needed for every org,
+            # load them in the background while the org data is fetched
+            dict_futures = [
+                executor.submit(dict_func, fetch_from_api=fetch_dicts_from_api)
+                for dict_func in (self._purpose_by_id, self._type_by_id)
+            ]
+            # Fetch the data of all orgs concurrently, the API calls are
+            # independent of each other
+            all_data = asyncio.run(
+                self._fetch_data_by_codes(code_by_org.values()))
+            data_by_org = dict(zip(code_by_org, all_data))
+            # Parents among the fetched orgs do not need to be requested
+            # again
+            name_by_code = {
+                code: data['preferredLabel']
+                for code, data in zip(code_by_org.values(), all_data)
+                if data is not None
+            }
+            # The rest of the parents are requested once each, concurrently
+            parent_codes = list({
+                data['subOrganizationOf'] for data in all_data
+                if data is not None and data.get('subOrganizationOf') and
+                data['subOrganizationOf'] not in name_by_code
+            })
+            name_by_code.update(zip(
+                parent_codes, executor.map(self._name_by_code, parent_codes)))
+            purpose_by_id, type_by_id = (
+                future.result() for future in dict_futures)
+        # Ids added upstream since the dictionaries were saved are only in
+        # a fresh copy
+        if not fetch_dicts_from_api:
+            purpose_ids = {
+                id_ for data in all_data if data is not None
+                for id_ in data.get('purpose') or ()
+            }
+            if not purpose_ids <= purpose_by_id.keys():
+                purpose_by_id = self._purpose_by_id(fetch_from_api=True)
+            type_ids = {
+                data.get('organizationType') for data in all_data
+                if data is not None and data.get('organizationType')
+            }
+            if not type_ids <= type_by_id.keys():
+                type_by_id = self._type_by_id(fetch_from_api=True)
+        for org, data in data_by_org.items():
             if data is None:
                 continue
             details[org] = data
             # Replace parent code with parent name (preferredLabel)
             parent_code = details[org].get('subOrganizationOf')
             if parent_code:
-                parent_name = self._name_by_code(parent_code)
+                parent_name = name_by_code.get(parent_code)
                 if parent_name is None:
                     parent_name = ''
                 details[org]['subOrganizationOf'] = parent_name
@@ -321,7 +568,7 @@ class Organization:
             # Replace purpose ids with purpose (function) names
             if purpose_ids:
                 details[org]['purpose'] = ','.join([
-                    self._purpose_by_id[id_] for id_ in purpose_ids])
+                    purpose_by_id[id_] for id_ in purpose_ids])
             # Replace status with greek translation
             status = details[org].get('status')
             if status:
@@ -329,27 +576,31 @@ class Organization:
             # Replace type id with type name
             type_id = details[org].get('organizationType')
             if type_id:
-                details[org]['organizationType'] = self._type_by_id[type_id]
+                details[org]['organizationType'] = type_by_id[type_id]
             logger.debug(f'{org} - fetched details')
         logger.debug('Fetched org details.')
         return details
 
     def _all(self, fetch_from_api=False):
-        return _data(self.ALL_ORGS_PICKLE_FILE,
+        return _data(self.ALL_ORGS_CACHE_FILE,
                      self._fetch_all_from_api,
-                     fetch_from_api=fetch_from_api)
+                     fetch_from_api=fetch_from_api,
+                     legacy_file=self.ALL_ORGS_LEGACY_CACHE_FILE)
 
     def _hierarchy(self, fetch_from_api=False):
-        return _data(self.HIERARCHY_PICKLE_FILE,
+        return _data(self.HIERARCHY_CACHE_FILE,
                      self._fetch_hierarchy_from_api,
-                     fetch_from_api=fetch_from_api)
+                     fetch_from_api=fetch_from_api,
+                     legacy_file=self.HIERARCHY_LEGACY_CACHE_FILE)
 
     def _details(self, fetch_from_api=False):
-        return _data(self.DETAILS_PICKLE_FILE,
-                     self.fetch_details_from_api,
-                     fetch_from_api=fetch_from_api)
+        return _data(self.DETAILS_CACHE_FILE,
+                     functools.partial(self.fetch_details_from_api,
+                                       fetch_dicts_from_api=fetch_from_api),
+                     fetch_from_api=fetch_from_api,
+                     legacy_file=self.DETAILS_LEGACY_CACHE_FILE)
 
-    def _all_page_names(self, without_namespace=False):
+    def _iter_page_names(self):
         action = 'query'
         list_param = 'allpages'
         continue_param = 'continue'
@@ -360,22 +611,26 @@ class Organization:
             'apnamespace': self.NAMESPACE_NUMBER,
             'aplimit': 5000
         }
-        page_names = []
         continue_value = 0
         while continue_value is not None:
             answer = self._site.api(action, **kwargs)
             continue_value = answer.get(
                 continue_param, {}).get(apcontinue_param)
             kwargs[apcontinue_param] = continue_value
-            page_names += [page_result['title']
-                           for page_result in answer[action][list_param]]
-        if without_namespace:
-            page_names = [name.replace(f'{self.NAMESPACE}:', '')
-                          for name in page_names]
-        return page_names
+            for page_result in answer[action][list_param]:
+                yield page_result['title']
+
+    def _all_page_names(self, without_namespace=False):
+        if not without_namespace:
+            return list(self._iter_page_names())
+        namespace_prefix = f'{self.NAMESPACE}:'
+        namespace_prefix_len = len(namespace_prefix)
+        return [title[namespace_prefix_len:]
+                if title.startswith(namespace_prefix) else title
+                for title in self._iter_page_names()]
 
     def _all_pages(self):
-        for name in self._all_page_names():
+        for name in self._iter_page_names():
             page = self._get_site_page(name)
             if page is not None:
                 yield page
@@ -384,17 +639,33 @@ class Organization:
         for page in self._site.categories[self.CATALOGUE_CATEGORY_NAME]:
             yield page
 
-    def _create_pages(self, name, parent_category=None):
+    def _create_pages(self, name, parent_category=None, page_texts=None,
+                      site_pages=None):
         if parent_category is None:
             parent_category = self.CATEGORY
             replace_text = None
         else:
             replace_text = self.CATEGORY
-        category_page = self._get_site_page(name, is_category=True)
-        _add_text_to_page(category_page, parent_category,
-                          replace_text=replace_text)
-        page = self._get_site_page(f'{self.NAMESPACE}:{name}')
-        _add_text_to_page(page, self.CATALOGUE_CATEGORY)
+        if page_texts is None:
+            page_texts = {}
+        if site_pages is None:
+            site_pages = {}
+        category_page_title = f'Category:{name}'
+        category_page = site_pages.get(category_page_title)
+        if category_page is None:
+            category_page = self._get_site_page(name, is_category=True)
+            site_pages[category_page_title] = category_page
+        page_texts[category_page_title] = _add_text_to_page(
+            category_page, parent_category, replace_text=replace_text,
+            page_text=page_texts.get(category_page_title))
+        page_title = f'{self.NAMESPACE}:{name}'
+        page = site_pages.get(page_title)
+        if page is None:
+            page = self._get_site_page(page_title)
+            site_pages[page_title] = page
+        page_texts[page_title] = _add_text_to_page(
+            page, self.CATALOGUE_CATEGORY,
+            page_text=page_texts.get(page_title))
 
     @_cli_command
     def recreate_tree(self, fetch_from_api=False):
@@ -405,13 +676,20 @@ class Organization:
                 data from the API or read the most recently saved data.
         """
         logger.debug('Creating organization category tree and pages...')
+        # Orgs that are both parents and children are visited twice, keep
+        # the pages and their texts around instead of fetching them again
+        page_texts = {}
+        site_pages = {}
         for parent, children in self._hierarchy(
                 fetch_from_api=fetch_from_api).items():
-            self._create_pages(parent)
+            self._create_pages(parent, page_texts=page_texts,
+                               site_pages=site_pages)
             parent_category = f'[[Category:{parent}]]'
-            for child in children:
+            # A repeated child would only be a no-op
+            for child in dict.fromkeys(children):
                 self._create_pages(
-                    child, parent_category=parent_category)
+                    child, parent_category=parent_category,
+                    page_texts=page_texts, site_pages=site_pages)
         logger.debug('Done.')
 
     @_cli_command
@@ -458,50 +736,44 @@ class Organization:
         logger.debug('Updating organization pages...')
 
         def template_text(org_details):
-            te = TemplateEditor(self.TEMPLATE)
-            template = te.templates[self.TEMPLATE_NAME][0]
+            values = {}
             # Add details to template parameters
-            for key in self.TEMPLATE_FIELD_NAME_SUFFIXES:
-                if '_' in key:
-                    details_keys = key.split('_')
-                else:
-                    details_keys = None
+            for key, details_keys in self.TEMPLATE_FIELDS:
                 if details_keys is None:
                     value = org_details.get(key, None)
                 else:
                     value = org_details.get(details_keys[0], {}).get(
                         details_keys[1], None)
-                if value is not None:
+                if value is None:
+                    value = ''
+                else:
                     if isinstance(value, list):
                         value = ','.join(value)
                     value = escape(str(value))
                     # Clean up telephone value
                     if key == self.TEMPLATE_CONTACT_POINT_TELEPHONE:
-                        value = value.replace(' ', '').replace('+30', '')
-                        new_value = ''
-                        for c in value:
-                            if not c.isdigit():
-                                break
-                            new_value += c
-                        value = new_value
-                    template.parameters[
-                        f'{self.TEMPLATE_PARAM_PREFIX}{key}'] = value
-            return str(template).replace(' |', '|')
+                        value = self.LEADING_DIGITS_REGEX.match(
+                            value.replace(' ', '').replace('+30', '')).group()
+                values[key] = value.strip().replace(' |', '|')
+            return self.TEMPLATE_FORMAT.format_map(values)
         if details is None:
             details = self._details(fetch_from_api=fetch_from_api)
-        for org, org_details in details.items():
-            page = self._get_site_page(f'{self.NAMESPACE}:{org}')
+        org_by_title = {f'{self.NAMESPACE}:{org}': org for org in details}
+        for title, page, page_text, edit_kwargs in self._pages_with_text(
+                list(org_by_title)):
             page_condition = page is not None
             if not force_create:
                 page_condition = page_condition and page.exists
             if page_condition:
-                page_text = page.text()
-                page_text_leftovers = re.sub(
-                    rf'{{{{{self.TEMPLATE_NAME}[^{{}}]+}}}}', '',
-                    page_text).strip()
-                new_template_text = template_text(org_details)
+                page_text_leftovers = self.TEMPLATE_REGEX.sub(
+                    '', page_text).strip()
+                new_template_text = template_text(
+                    details[org_by_title[title]])
                 new_page_text = f'{new_template_text}\n{page_text_leftovers}'
-                page.edit(new_page_text)
+                if new_page_text.strip() == page_text.strip():
+                    logger.debug(f'{page.name} unchanged')
+                    continue
+                page.edit(new_page_text, **edit_kwargs)
                 logger.debug(f'{page.name} updated')
         logger.debug('Done.')
 
@@ -515,10 +787,10 @@ class Organization:
             dry_run (bool): Whether to perform a dry run or do the actual
                 deletion.
         """
-        latest_org_names = [
-            re.sub(' +', ' ', org['preferredLabel'].strip())
+        latest_org_names = {
+            ' '.join(org['preferredLabel'].split())
             for org in self._all(fetch_from_api=fetch_from_api)
-        ]
+        }
         for org_page in self._all_pages_simple():
             org_page_title = org_page.page_title
             if org_page_title not in latest_org_names:
@@ -558,22 +830,26 @@ class Organization:
             ]
         """
         units = []
-
-        def add_sub_unit(unit):
-            children = unit.get('children')
-            if children is not None:
-                for child in children:
-                    add_sub_unit(child)
-                del unit['children']
-            units.append(unit)
         org_code = self._code_by_name(name)
         if org_code is not None:
             org_tree = self._tree_by_code(org_code)
             if org_tree is not None:
-                for org in org_tree.get('children', []):
-                    add_sub_unit(org)
-            if unit_types is not None:
-                units = [unit for unit in units
-                         if unit['unitType'] in unit_types]
-        result = units
-        return result
+                # Iterative post-order traversal, each unit comes after its
+                # sub units. The flag tells whether the sub units of a unit
+                # have already been pushed on the stack.
+                stack = [(unit, False) for unit in reversed(
+                    org_tree.get('children', []))]
+                while stack:
+                    unit, expanded = stack.pop()
+                    if expanded:
+                        if unit_types is None or \
+                                unit['unitType'] in unit_types:
+                            units.append(unit)
+                        continue
+                    stack.append((unit, True))
+                    children = unit.get('children')
+                    if children is not None:
+                        del unit['children']
+                        stack.extend(
+                            (child, False) for child in reversed(children))
+        return units
@@ -54,6 +54,11 @@ class Site:
             message = f'Page title: {name}. {str(e)}'
             _error(message)
 
+    def page_from_info(self, info):
+        """Get page from the page info returned by a query, without
+        requesting it again."""
+        return mwclient.page.Page(self._client, info['title'], info=info)
+
     def login(self, username='', password='', auto=False, force=False):
         """Login by username and password."""
         if self._logged_in and not force:
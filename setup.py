@@ -13,6 +13,8 @@ setup(
         'Flask==1.1.1',
         'pymongo==3.11.0',
         'requests==2.22.0',
+        'msgspec==0.18.6',
+        'zstandard==0.22.0',
         'mwtemplates==0.4.0',
         'jsonschema==3.2.0',
         'aiohttp==3.7.3',